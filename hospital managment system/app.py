@@ -1,16 +1,112 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash, send_from_directory, g, abort, make_response, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+import sqlalchemy as sa
 from werkzeug.security import generate_password_hash, check_password_hash
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from functools import wraps
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+import atexit
+import gzip
+import json
+import math
+import mimetypes
 import os
+import signal
+import sys
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///hospital.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///hospital.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.secret_key = "hospital_secret_key_secure_2025"
 
-db = SQLAlchemy(app)
+# Static asset pipeline (see build_assets.py) and response compression
+app.config['ASSET_DIST_DIR'] = os.path.join(app.static_folder, 'dist')
+app.config['ASSET_MAX_AGE'] = 365 * 24 * 3600
+app.config['COMPRESS_MIN_SIZE'] = 500
+app.config['COMPRESS_LEVEL'] = 6
+app.config['COMPRESS_MIMETYPES'] = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript',
+    'application/javascript', 'application/json',
+}
+
+
+# Admission control: requests in flight across the app, slots only staff may use, and
+# per-endpoint limits (concurrency plus a per-user/IP token bucket of `rate`/s, `burst`)
+# applied to the listed `methods`; the defaults only limit writes, not page loads
+app.config['ADMISSION_MAX_CONCURRENT'] = 16
+app.config['ADMISSION_STAFF_RESERVED'] = 4
+app.config['ADMISSION_QUEUE_SIZE'] = 32
+app.config['ADMISSION_QUEUE_TIMEOUT'] = 2.0
+app.config['ADMISSION_RETRY_AFTER'] = 2
+app.config['ADMISSION_ENDPOINT_LIMITS'] = {
+    'patient_book_appointment': {'concurrency': 2, 'rate': 1.0, 'burst': 5, 'methods': {'POST'}},
+    'api_appointments': {'concurrency': 4, 'rate': 5.0, 'burst': 20, 'methods': {'POST'}},
+}
+
+
+def parse_branches(value):
+    """Parse "code=uri,code=uri" into an ordered {code: uri} mapping."""
+    branches = {}
+    for item in value.split(','):
+        code, _, uri = item.strip().partition('=')
+        if code and uri:
+            branches[code.strip()] = uri.strip()
+    return branches
+
+
+# Users and departments live in the shared directory database above. Each branch keeps
+# its own appointments, availability and treatments in a separate database.
+app.config['HOSPITAL_BRANCHES'] = parse_branches(
+    os.environ.get('HOSPITAL_BRANCHES', 'main=' + app.config['SQLALCHEMY_DATABASE_URI']))
+app.config['DEFAULT_BRANCH'] = next(iter(app.config['HOSPITAL_BRANCHES']))
+# A branch stored in the directory database shares its engine, so one session never holds
+# two connections to the same SQLite file
+app.config['SQLALCHEMY_BINDS'] = {f'branch:{code}': uri for code, uri in app.config['HOSPITAL_BRANCHES'].items()
+                                  if uri != app.config['SQLALCHEMY_DATABASE_URI']}
+
+# Audit entries are buffered in memory and written in batches to their own database
+app.config['SQLALCHEMY_BINDS']['audit'] = os.environ.get('AUDIT_DATABASE_URL', 'sqlite:///audit.db')
+app.config['AUDIT_BATCH_SIZE'] = 100
+app.config['AUDIT_FLUSH_INTERVAL'] = 1.0
+# Past this many unwritten entries (e.g. while the audit database is down), new entries
+# are appended to the overflow file instead of being held in memory
+app.config['AUDIT_BUFFER_LIMIT'] = 50000
+app.config['AUDIT_OVERFLOW_PATH'] = os.path.join(app.instance_path, 'audit_overflow.jsonl')
+
+
+def current_branch():
+    return g.get('branch') or app.config['DEFAULT_BRANCH']
+
+
+def branch_engine(code):
+    return db.engines.get(f'branch:{code}', db.engine)
+
+
+class BranchSession(Session):
+    """Session that sends models bound to "branch" to the current branch's database."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and mapper is not None:
+            table = sa.inspect(mapper).local_table
+            if table.metadata.info.get('bind_key') == 'branch':
+                return branch_engine(current_branch())
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(app, session_options={'class_': BranchSession})
+# Every request admitted at once may fan out to every branch
+branch_executor = ThreadPoolExecutor(
+    max_workers=len(app.config['HOSPITAL_BRANCHES']) * app.config['ADMISSION_MAX_CONCURRENT'])
 
 
 class Department(db.Model):
@@ -47,11 +143,15 @@ class User(db.Model):
     # For doctors: specialization
     specialization = db.Column(db.String(150), nullable=True)
 
-    # Relationships
-    appointments_as_doctor = db.relationship("Appointment", back_populates="doctor", foreign_keys="Appointment.doctor_id")
-    appointments_as_patient = db.relationship("Appointment", back_populates="patient", foreign_keys="Appointment.patient_id")
-    availabilities = db.relationship("Availability", back_populates="doctor", cascade="all, delete-orphan")
-    treatments = db.relationship("Treatment", back_populates="doctor")
+    # Relationships into the current branch's database
+    appointments_as_doctor = db.relationship("Appointment", back_populates="doctor",
+                                             primaryjoin="User.id == foreign(Appointment.doctor_id)")
+    appointments_as_patient = db.relationship("Appointment", back_populates="patient",
+                                              primaryjoin="User.id == foreign(Appointment.patient_id)")
+    availabilities = db.relationship("Availability", back_populates="doctor", cascade="all, delete-orphan",
+                                     primaryjoin="User.id == foreign(Availability.doctor_id)")
+    treatments = db.relationship("Treatment", back_populates="doctor",
+                                 primaryjoin="User.id == foreign(Treatment.doctor_id)")
 
     def __repr__(self):
         return f"<User {self.username} ({self.role})>"
@@ -65,10 +165,12 @@ class User(db.Model):
 
 class Appointment(db.Model):
     __tablename__ = 'appointments'
+    __bind_key__ = 'branch'
 
     id = db.Column(db.Integer, primary_key=True)
-    patient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    doctor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # users.id in the directory database, so no database-level foreign key
+    patient_id = db.Column(db.Integer, nullable=False)
+    doctor_id = db.Column(db.Integer, nullable=False)
     appointment_date = db.Column(db.Date, nullable=False)
     appointment_time = db.Column(db.Time, nullable=False)
     status = db.Column(db.String(50), default='Booked', nullable=False)  # Booked, Completed, Cancelled
@@ -76,8 +178,10 @@ class Appointment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # Relationships
-    patient = db.relationship("User", back_populates="appointments_as_patient", foreign_keys=[patient_id])
-    doctor = db.relationship("User", back_populates="appointments_as_doctor", foreign_keys=[doctor_id])
+    patient = db.relationship("User", back_populates="appointments_as_patient",
+                              primaryjoin="foreign(Appointment.patient_id) == User.id")
+    doctor = db.relationship("User", back_populates="appointments_as_doctor",
+                             primaryjoin="foreign(Appointment.doctor_id) == User.id")
     treatment = db.relationship("Treatment", back_populates="appointment", uselist=False, cascade="all, delete-orphan")
 
     def __repr__(self):
@@ -86,10 +190,11 @@ class Appointment(db.Model):
 
 class Treatment(db.Model):
     __tablename__ = 'treatment'
+    __bind_key__ = 'branch'
 
     id = db.Column(db.Integer, primary_key=True)
     appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'), nullable=False)
-    doctor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    doctor_id = db.Column(db.Integer, nullable=False)
     diagnosis = db.Column(db.Text, nullable=True)
     prescription = db.Column(db.Text, nullable=True)
     notes = db.Column(db.Text, nullable=True)
@@ -97,7 +202,8 @@ class Treatment(db.Model):
 
     # Relationships
     appointment = db.relationship("Appointment", back_populates="treatment")
-    doctor = db.relationship("User", back_populates="treatments")
+    doctor = db.relationship("User", back_populates="treatments",
+                             primaryjoin="foreign(Treatment.doctor_id) == User.id")
 
     def __repr__(self):
         return f"<Treatment for Appointment {self.appointment_id}>"
@@ -105,21 +211,485 @@ class Treatment(db.Model):
 
 class Availability(db.Model):
     __tablename__ = 'availability'
+    __bind_key__ = 'branch'
 
     id = db.Column(db.Integer, primary_key=True)
-    doctor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    doctor_id = db.Column(db.Integer, nullable=False)
     available_date = db.Column(db.Date, nullable=False)
     start_time = db.Column(db.Time, nullable=False)
     end_time = db.Column(db.Time, nullable=False)
     is_available = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    doctor = db.relationship("User", back_populates="availabilities")
+    doctor = db.relationship("User", back_populates="availabilities",
+                             primaryjoin="foreign(Availability.doctor_id) == User.id")
 
     def __repr__(self):
         return f"<Availability {self.doctor.full_name} on {self.available_date}>"
 
 
+class AuditEntry(db.Model):
+    __tablename__ = 'audit_log'
+    __bind_key__ = 'audit'
+    __table_args__ = (db.Index('ix_audit_log_entity', 'entity_type', 'entity_id', 'created_at'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    entity_type = db.Column(db.String(50), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    branch = db.Column(db.String(50), nullable=True)  # set for branch-bound entities
+    action = db.Column(db.String(20), nullable=False)  # create, update, delete
+    changed_by = db.Column(db.Integer, nullable=True)  # users.id, None for system changes
+    old_values = db.Column(db.Text, nullable=True)  # JSON
+    new_values = db.Column(db.Text, nullable=True)  # JSON
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'entity_type': self.entity_type,
+            'entity_id': self.entity_id,
+            'branch': self.branch,
+            'action': self.action,
+            'changed_by': self.changed_by,
+            'old_values': json.loads(self.old_values) if self.old_values else None,
+            'new_values': json.loads(self.new_values) if self.new_values else None,
+            'created_at': self.created_at.isoformat()
+        }
+
+    def __repr__(self):
+        return f"<AuditEntry {self.action} {self.entity_type} {self.entity_id}>"
+
+
+# Models whose changes are audited, with columns that must never be written to the log
+AUDITED_MODELS = {
+    User: {'password'},
+    Appointment: set(),
+    Treatment: set(),
+}
+
+
+def create_all_databases():
+    """Create the directory tables and the branch tables in every branch database."""
+    db.create_all(bind_key=[None, 'audit'])
+    for code in app.config['HOSPITAL_BRANCHES']:
+        db.metadatas['branch'].create_all(bind=branch_engine(code))
+
+
+def fan_out(query):
+    """Run query(branch) against every branch in parallel and return {branch: result}.
+
+    Each call gets its own app context and session, so ORM objects it returns are
+    detached: load anything the caller needs before returning. With a single branch
+    the query runs inline, in the caller's context, without a thread hop.
+    """
+    branches = app.config['HOSPITAL_BRANCHES']
+    if len(branches) == 1:
+        return {code: query(code) for code in branches}
+
+    def run(code):
+        with app.app_context():
+            g.branch = code
+            return query(code)
+
+    futures = {code: branch_executor.submit(run, code) for code in branches}
+    return {code: future.result() for code, future in futures.items()}
+
+
+class AuditLog:
+    """Write-behind buffer for audit entries.
+
+    Entries are queued once their transaction commits and written in batches by a
+    background thread. A failed batch stays queued for the next attempt, and the
+    buffer is flushed synchronously at interpreter shutdown. Entries that arrive
+    while `buffer_limit` entries are pending go to an append-only overflow file,
+    which is replayed into the database once the buffer has been written out.
+    """
+
+    def __init__(self, batch_size, flush_interval, buffer_limit, overflow_path):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer_limit = buffer_limit
+        self.overflow_path = overflow_path
+        self.overflowing = False
+        self.buffer = deque()
+        self.buffer_lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def enqueue(self, entries):
+        with self.buffer_lock:
+            room = max(self.buffer_limit - len(self.buffer), 0)
+            self.buffer.extend(entries[:room])
+            if len(entries) > room:
+                self._overflow(entries[room:])
+        if self.thread is None:
+            self.start()
+        if len(self.buffer) >= self.batch_size:
+            self.wake.set()
+
+    def _overflow(self, entries):
+        if not self.overflowing:
+            app.logger.error('Audit buffer holds %d unwritten entries; appending new entries to %s. '
+                             'Check that the audit database is reachable.', len(self.buffer), self.overflow_path)
+            self.overflowing = True
+        os.makedirs(os.path.dirname(self.overflow_path), exist_ok=True)
+        with open(self.overflow_path, 'a') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, default=str) + '\n')
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopping.is_set():
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                app.logger.exception('Failed to write audit entries; will retry.')
+
+    def _insert(self, entries):
+        with app.app_context():
+            for start in range(0, len(entries), self.batch_size):
+                db.session.execute(sa.insert(AuditEntry), entries[start:start + self.batch_size])
+            db.session.commit()
+
+    def _replay_overflow(self):
+        # The file is moved aside first so entries spilled during the replay are kept for
+        # the next one; a replay file left by a failed attempt is retried as it is
+        replay_path = self.overflow_path + '.replay'
+        with self.buffer_lock:
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.overflow_path):
+                    return
+                os.replace(self.overflow_path, replay_path)
+
+        with open(replay_path) as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        for entry in entries:
+            entry['created_at'] = datetime.fromisoformat(entry['created_at'])
+        if entries:
+            self._insert(entries)
+        os.remove(replay_path)
+        app.logger.info('Replayed %d audit entries from %s.', len(entries), self.overflow_path)
+
+    def flush(self):
+        with self.flush_lock:
+            while self.buffer:
+                with self.buffer_lock:
+                    batch = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+                try:
+                    self._insert(batch)
+                except Exception:
+                    with self.buffer_lock:
+                        self.buffer.extendleft(reversed(batch))
+                    raise
+            self.overflowing = False
+            self._replay_overflow()
+
+    def stop(self):
+        self.stopping.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+        try:
+            self.flush()
+        except Exception:
+            # Last chance: keep whatever could not be written for the next run to replay
+            app.logger.exception('Failed to write audit entries at shutdown; saving them to %s.',
+                                 self.overflow_path)
+            with self.buffer_lock:
+                remaining = list(self.buffer)
+                self.buffer.clear()
+                if remaining:
+                    self._overflow(remaining)
+
+
+audit_log = AuditLog(app.config['AUDIT_BATCH_SIZE'], app.config['AUDIT_FLUSH_INTERVAL'],
+                     app.config['AUDIT_BUFFER_LIMIT'], app.config['AUDIT_OVERFLOW_PATH'])
+atexit.register(audit_log.stop)
+
+
+def handle_sigterm(signum, frame):
+    # atexit handlers do not run when the process dies from SIGTERM (docker stop, systemd),
+    # so turn it into a normal exit and let audit_log.stop() flush the buffer
+    sys.exit(0)
+
+
+def audit_values(state, keys):
+    return json.dumps({key: state.attrs[key].value for key in keys}, default=str) if keys else None
+
+
+@sa.event.listens_for(BranchSession, 'after_flush')
+def capture_audit_entries(db_session, flush_context):
+    changed_by = session.get('user_id') if has_request_context() else None
+    now = datetime.utcnow()
+    pending = db_session.info.setdefault('audit_pending', [])
+
+    for action, objects in (('create', db_session.new), ('update', db_session.dirty), ('delete', db_session.deleted)):
+        for obj in objects:
+            if type(obj) not in AUDITED_MODELS:
+                continue
+            state = sa.inspect(obj)
+            keys = [attr.key for attr in state.mapper.column_attrs if attr.key not in AUDITED_MODELS[type(obj)]]
+
+            if action == 'create':
+                old_values, new_values = None, audit_values(state, keys)
+            elif action == 'delete':
+                old_values, new_values = audit_values(state, keys), None
+            else:
+                changed = [key for key in keys if state.attrs[key].history.has_changes()]
+                if not changed:
+                    continue
+                old_values = json.dumps({key: (state.attrs[key].history.deleted or [None])[0] for key in changed},
+                                        default=str)
+                new_values = audit_values(state, changed)
+
+            pending.append({
+                'entity_type': type(obj).__name__,
+                'entity_id': state.mapper.primary_key_from_instance(obj)[0],
+                'branch': current_branch() if state.mapper.local_table.metadata.info.get('bind_key') == 'branch' else None,
+                'action': action,
+                'changed_by': changed_by,
+                'old_values': old_values,
+                'new_values': new_values,
+                'created_at': now
+            })
+
+
+@sa.event.listens_for(BranchSession, 'after_commit')
+def queue_audit_entries(db_session):
+    entries = db_session.info.pop('audit_pending', None)
+    if entries:
+        audit_log.enqueue(entries)
+
+
+@sa.event.listens_for(BranchSession, 'after_rollback')
+def discard_audit_entries(db_session):
+    db_session.info.pop('audit_pending', None)
+
+
+@app.before_request
+def select_branch():
+    # Static files never touch a branch; reading the session here would add Vary: Cookie
+    if request.endpoint in (None, 'static', 'assets'):
+        return
+    # API clients pass the branch explicitly; browser users pick one at login
+    code = request.headers.get('X-Branch') or request.args.get('branch') or session.get('branch')
+    if code and code not in app.config['HOSPITAL_BRANCHES']:
+        abort(404)
+    g.branch = code or app.config['DEFAULT_BRANCH']
+
+
+@app.context_processor
+def inject_branches():
+    return {'branches': list(app.config['HOSPITAL_BRANCHES']), 'current_branch': current_branch()}
+
+
+def load_asset_manifest():
+    manifest_path = os.path.join(app.config['ASSET_DIST_DIR'], 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+asset_manifest = load_asset_manifest()
+
+
+@app.template_global()
+def asset_url(filename):
+    """URL of the fingerprinted build of a static file, or the plain static URL if it has not been built."""
+    if filename in asset_manifest:
+        return url_for('assets', filename=asset_manifest[filename])
+    return url_for('static', filename=filename)
+
+
+def negotiate_encoding(available):
+    for encoding in ('br', 'gzip'):
+        if encoding in available and request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+@app.route('/assets/<path:filename>')
+def assets(filename):
+    # Fingerprinted names never change content, so they can be cached forever
+    dist_dir = app.config['ASSET_DIST_DIR']
+    available = [enc for enc, ext in (('br', '.br'), ('gzip', '.gz'))
+                 if os.path.isfile(os.path.join(dist_dir, filename + ext))]
+    encoding = negotiate_encoding(available)
+    if encoding:
+        ext = '.br' if encoding == 'br' else '.gz'
+        response = send_from_directory(dist_dir, filename + ext, mimetype=mimetypes.guess_type(filename)[0])
+        response.headers['Content-Encoding'] = encoding
+        del response.headers['Content-Disposition']
+    else:
+        response = send_from_directory(dist_dir, filename)
+    response.headers['Cache-Control'] = f"public, max-age={app.config['ASSET_MAX_AGE']}, immutable"
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code >= 300
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in app.config['COMPRESS_MIMETYPES']):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    encoding = negotiate_encoding(['br', 'gzip'] if brotli else ['gzip'])
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=app.config['COMPRESS_LEVEL']))
+    elif encoding == 'gzip':
+        response.set_data(gzip.compress(data, compresslevel=app.config['COMPRESS_LEVEL']))
+    else:
+        return response
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+class ConcurrencyLimiter:
+    """Caps concurrent requests with a bounded wait queue.
+
+    Priority (staff) requests may use the `reserved` slots and are admitted ahead of
+    waiting normal requests; only normal requests are shed when the queue is full.
+    """
+
+    def __init__(self, capacity, queue_size, reserved=0):
+        self.capacity = capacity
+        self.queue_size = queue_size
+        self.reserved = reserved
+        self.active = 0
+        self.waiting = {True: 0, False: 0}
+        self.condition = threading.Condition()
+        self.stats = {'admitted': 0, 'queued': 0, 'shed_queue_full': 0, 'shed_timeout': 0}
+
+    def _can_enter(self, priority):
+        if priority:
+            return self.active < self.capacity
+        return self.active < self.capacity - self.reserved and not self.waiting[True]
+
+    def acquire(self, priority=False, timeout=None):
+        with self.condition:
+            if not self._can_enter(priority):
+                if not priority and self.waiting[False] >= self.queue_size:
+                    self.stats['shed_queue_full'] += 1
+                    return False
+                self.stats['queued'] += 1
+                self.waiting[priority] += 1
+                try:
+                    admitted = self.condition.wait_for(lambda: self._can_enter(priority), timeout)
+                finally:
+                    self.waiting[priority] -= 1
+                    if priority:
+                        self.condition.notify_all()
+                if not admitted:
+                    self.stats['shed_timeout'] += 1
+                    return False
+            self.active += 1
+            self.stats['admitted'] += 1
+            return True
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    def snapshot(self):
+        with self.condition:
+            return dict(self.stats, active=self.active, waiting=sum(self.waiting.values()))
+
+
+class RateLimiter:
+    """Token bucket per client key: `rate` requests per second with bursts up to `burst`."""
+
+    MAX_CLIENTS = 10000
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.shed = 0
+
+    def take(self, key):
+        """Spend a token for key. Returns 0 if allowed, else seconds until a token is available."""
+        now = time.monotonic()
+        with self.lock:
+            if len(self.buckets) > self.MAX_CLIENTS:
+                self._prune(now)
+            tokens, updated = self.buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now)
+                return 0
+            self.buckets[key] = (tokens, now)
+            self.shed += 1
+            return (1 - tokens) / self.rate
+
+    def _prune(self, now):
+        # Forget clients whose bucket has refilled completely
+        self.buckets = {key: (tokens, updated) for key, (tokens, updated) in self.buckets.items()
+                        if tokens + (now - updated) * self.rate < self.burst}
+
+
+app_limiter = ConcurrencyLimiter(app.config['ADMISSION_MAX_CONCURRENT'],
+                                 app.config['ADMISSION_QUEUE_SIZE'],
+                                 reserved=app.config['ADMISSION_STAFF_RESERVED'])
+endpoint_limiters = {
+    endpoint: (ConcurrencyLimiter(limits['concurrency'], app.config['ADMISSION_QUEUE_SIZE']),
+               RateLimiter(limits['rate'], limits['burst']),
+               limits.get('methods'))
+    for endpoint, limits in app.config['ADMISSION_ENDPOINT_LIMITS'].items()
+}
+
+
+def is_staff_request():
+    # Admins and doctors (the admin_* and doctor_* routes) are never queued behind patients
+    return session.get('role') in ('admin', 'doctor')
+
+
+@app.before_request
+def admit_request():
+    if request.endpoint in (None, 'static', 'assets'):
+        return
+    g.admission_permits = []
+    timeout = app.config['ADMISSION_QUEUE_TIMEOUT']
+    priority = is_staff_request()
+
+    concurrency, rate, methods = endpoint_limiters.get(request.endpoint, (None, None, None))
+    if concurrency and not priority and (methods is None or request.method in methods):
+        wait = rate.take(session.get('user_id') or request.remote_addr)
+        if wait:
+            raise TooManyRequests('Too many requests. Please try again shortly.', retry_after=math.ceil(wait))
+        if not concurrency.acquire(timeout=timeout):
+            raise ServiceUnavailable('The system is busy. Please try again shortly.',
+                                     retry_after=app.config['ADMISSION_RETRY_AFTER'])
+        g.admission_permits.append(concurrency)
+
+    if not app_limiter.acquire(priority=priority, timeout=timeout):
+        raise ServiceUnavailable('The system is busy. Please try again shortly.',
+                                 retry_after=app.config['ADMISSION_RETRY_AFTER'])
+    g.admission_permits.append(app_limiter)
+
+
+@app.teardown_request
+def release_admission(exc):
+    for limiter in g.pop('admission_permits', []):
+        limiter.release()
+
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -198,6 +768,8 @@ def login():
         if user and user.check_password(password) and user.is_active:
             session['user_id'] = user.id
             session['role'] = user.role
+            branch = request.form.get('branch')
+            session['branch'] = branch if branch in app.config['HOSPITAL_BRANCHES'] else app.config['DEFAULT_BRANCH']
             flash(f'Welcome back, {user.full_name}!', 'success')
 
             if user.role == 'admin':
@@ -254,6 +826,17 @@ def register():
     return render_template('register.html')
 
 
+@app.route('/branch/<code>')
+@login_required
+def switch_branch(code):
+    if code not in app.config['HOSPITAL_BRANCHES']:
+        flash('Unknown branch.', 'danger')
+    else:
+        session['branch'] = code
+        flash(f'Switched to branch {code}.', 'info')
+    return redirect(url_for('index'))
+
+
 @app.route('/logout')
 def logout():
     session.clear()
@@ -268,17 +851,28 @@ def logout():
 def admin_dashboard():
     total_doctors = User.query.filter_by(role='doctor', is_active=True).count()
     total_patients = User.query.filter_by(role='patient', is_active=True).count()
-    total_appointments = Appointment.query.count()
-    upcoming_appointments = Appointment.query.filter(
-        Appointment.appointment_date >= datetime.now().date(),
-        Appointment.status != 'Cancelled'
-    ).count()
+
+    today = datetime.now().date()
+
+    def appointment_counts(branch):
+        return {
+            'total': Appointment.query.count(),
+            'upcoming': Appointment.query.filter(
+                Appointment.appointment_date >= today,
+                Appointment.status != 'Cancelled'
+            ).count()
+        }
+
+    branch_stats = fan_out(appointment_counts)
+    total_appointments = sum(stats['total'] for stats in branch_stats.values())
+    upcoming_appointments = sum(stats['upcoming'] for stats in branch_stats.values())
 
     return render_template('admin_dashboard.html',
                          total_doctors=total_doctors,
                          total_patients=total_patients,
                          total_appointments=total_appointments,
-                         upcoming_appointments=upcoming_appointments)
+                         upcoming_appointments=upcoming_appointments,
+                         branch_stats=branch_stats)
 
 
 @app.route('/admin/doctors', methods=['GET', 'POST'])
@@ -343,7 +937,18 @@ def admin_doctors():
 @app.route('/admin/appointments')
 @admin_required
 def admin_appointments():
-    appointments = Appointment.query.all()
+    def branch_appointments(branch):
+        # Eager-load patients and doctors from the directory so the detached rows can render them
+        appointments = Appointment.query.options(
+            db.selectinload(Appointment.patient),
+            db.selectinload(Appointment.doctor)
+        ).all()
+        for appointment in appointments:
+            appointment.branch = branch
+        return appointments
+
+    appointments = [a for rows in fan_out(branch_appointments).values() for a in rows]
+    appointments.sort(key=lambda a: (a.appointment_date, a.appointment_time))
     return render_template('admin_appointments.html', appointments=appointments)
 
 
@@ -361,6 +966,61 @@ def update_appointment_status(appointment_id):
     return redirect(url_for('admin_appointments'))
 
 
+@app.route('/admin/metrics/admission')
+@admin_required
+def admin_admission_metrics():
+    return jsonify({
+        'app': app_limiter.snapshot(),
+        'endpoints': {
+            endpoint: dict(concurrency.snapshot(), shed_rate_limited=rate.shed)
+            for endpoint, (concurrency, rate, methods) in endpoint_limiters.items()
+        }
+    })
+
+
+@app.route('/admin/audit')
+@admin_required
+def admin_audit_log():
+    def query_arg(name, parse):
+        value = request.args.get(name)
+        if not value:
+            return None
+        try:
+            return parse(value)
+        except ValueError:
+            abort(400, f'Invalid {name}: {value!r}')
+
+    entity_id = query_arg('entity_id', int)
+    # Ids are only unique within an entity type
+    if entity_id is not None and not request.args.get('entity_type'):
+        abort(400, 'entity_id requires entity_type')
+    since = query_arg('since', datetime.fromisoformat)
+    until = query_arg('until', datetime.fromisoformat)
+    limit = query_arg('limit', int)
+    limit = 100 if limit is None else max(1, min(limit, 1000))
+
+    # Write out buffered entries first so admins see their own recent changes
+    try:
+        audit_log.flush()
+    except Exception:
+        app.logger.exception('Failed to write audit entries; serving the stored log only.')
+
+    query = AuditEntry.query
+    if request.args.get('entity_type'):
+        query = query.filter(AuditEntry.entity_type == request.args['entity_type'])
+        if entity_id is not None:
+            query = query.filter(AuditEntry.entity_id == entity_id)
+    if request.args.get('branch'):
+        query = query.filter(AuditEntry.branch == request.args['branch'])
+    if since:
+        query = query.filter(AuditEntry.created_at >= since)
+    if until:
+        query = query.filter(AuditEntry.created_at < until)
+
+    entries = query.order_by(AuditEntry.created_at.desc(), AuditEntry.id.desc()).limit(limit).all()
+    return jsonify([entry.to_dict() for entry in entries])
+
+
 @app.route('/admin/search', methods=['GET', 'POST'])
 @admin_required
 def admin_search():
@@ -548,14 +1208,16 @@ def patient_book_appointment():
         date_obj = datetime.strptime(appointment_date, '%Y-%m-%d').date()
         time_obj = datetime.strptime(appointment_time, '%H:%M').time()
 
-        conflict = Appointment.query.filter(
-            Appointment.doctor_id == doctor_id,
-            Appointment.appointment_date == date_obj,
-            Appointment.appointment_time == time_obj,
-            Appointment.status != 'Cancelled'
-        ).first()
+        # Doctors are shared between branches, so the slot must be free at every branch
+        def find_conflict(branch):
+            return Appointment.query.filter(
+                Appointment.doctor_id == doctor_id,
+                Appointment.appointment_date == date_obj,
+                Appointment.appointment_time == time_obj,
+                Appointment.status != 'Cancelled'
+            ).first() is not None
 
-        if conflict:
+        if any(fan_out(find_conflict).values()):
             flash('This time slot is already booked. Please choose another.', 'warning')
         else:
             appointment = Appointment(
@@ -685,6 +1347,25 @@ def page_not_found(e):
     return render_template('index.html', error='Page not found'), 404
 
 
+@app.errorhandler(429)
+@app.errorhandler(503)
+def service_busy(e):
+    if request.path.startswith('/api/'):
+        response = jsonify({'error': e.description})
+    else:
+        # Resubmitting from this page keeps the rejected form's data, except for forms with
+        # passwords, which must never be echoed back into the page
+        resubmit_fields = None
+        if request.method == 'POST' and not any('password' in name for name in request.form):
+            resubmit_fields = list(request.form.items(multi=True))
+        response = make_response(render_template('busy.html', message=e.description, retry_after=e.retry_after,
+                                                 resubmit_fields=resubmit_fields))
+    response.status_code = e.code
+    if e.retry_after is not None:
+        response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+
 @app.errorhandler(500)
 def internal_error(e):
     db.session.rollback()
@@ -695,8 +1376,10 @@ def internal_error(e):
 # ============================================ Entry Point ============================================
 
 if __name__ == '__main__':
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
     with app.app_context():
-        db.create_all()
+        create_all_databases()
 
         # Create default departments
         departments_data = [
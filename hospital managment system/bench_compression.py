@@ -0,0 +1,70 @@
+"""Bytes-on-wire benchmark for static assets and dynamic responses.
+
+Seeds a throwaway database, then requests each URL with no compression, gzip
+and brotli and reports the transferred body size.
+
+    python build_assets.py && python bench_compression.py
+"""
+import os
+import tempfile
+from datetime import date, time, timedelta
+
+db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(db_dir, 'bench.db')
+os.environ['AUDIT_DATABASE_URL'] = 'sqlite:///' + os.path.join(db_dir, 'audit.db')
+
+from app import app, db, asset_manifest, create_all_databases, Department, User, Appointment  # noqa: E402
+
+ENCODINGS = ['identity', 'gzip', 'br']
+
+
+def seed(n_doctors=20, n_patients=200, n_appointments=1000):
+    create_all_databases()
+    department = Department(dep_name='Cardiology', description='Heart and circulatory system')
+    db.session.add(department)
+    db.session.flush()
+
+    doctors = [User(username=f'doctor{i}', email=f'doctor{i}@hospital.com', password='x',
+                    full_name=f'Doctor {i}', role='doctor', department_id=department.dep_id,
+                    specialization='Cardiology') for i in range(n_doctors)]
+    patients = [User(username=f'patient{i}', email=f'patient{i}@example.com', password='x',
+                     full_name=f'Patient {i}', phone='9999999999', role='patient') for i in range(n_patients)]
+    db.session.add_all(doctors + patients)
+    db.session.flush()
+
+    for i in range(n_appointments):
+        db.session.add(Appointment(
+            patient_id=patients[i % n_patients].id,
+            doctor_id=doctors[i % n_doctors].id,
+            appointment_date=date.today() + timedelta(days=i % 30),
+            appointment_time=time(9 + i % 8, 0),
+            status='Booked'
+        ))
+    db.session.commit()
+
+
+def measure(client, url):
+    sizes = {}
+    for encoding in ENCODINGS:
+        response = client.get(url, headers={'Accept-Encoding': encoding})
+        served = response.headers.get('Content-Encoding', 'identity')
+        sizes[encoding] = len(response.get_data()) if served == encoding else None
+    return sizes
+
+
+def main():
+    urls = ['/', '/login', '/api/doctors', '/api/patients', '/api/appointments']
+    urls += [f'/assets/{hashed}' for hashed in asset_manifest.values()]
+
+    with app.app_context():
+        seed()
+        client = app.test_client()
+        print(f"{'URL':<60} {'identity':>10} {'gzip':>10} {'br':>10}")
+        for url in urls:
+            sizes = measure(client, url)
+            print(f'{url:<60} ' + ' '.join(
+                f'{sizes[e]:>10}' if sizes[e] is not None else f"{'-':>10}" for e in ENCODINGS))
+
+
+if __name__ == '__main__':
+    main()
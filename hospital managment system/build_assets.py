@@ -0,0 +1,109 @@
+"""Build step for static assets.
+
+Copies every static file, including the third-party assets committed under
+static/vendor, into static/dist under a content-hashed name, and writes .gz (and
+.br when brotli is installed) siblings so the /assets route can serve them
+precompressed. The build never touches the network.
+
+    python build_assets.py                  # build static/dist
+    python build_assets.py --update-vendor  # re-download the pinned vendor files first
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+import urllib.request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+
+# Committed under static/vendor so offline deployments never need the CDN
+VENDOR_ASSETS = {
+    'vendor/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css',
+    'vendor/bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js',
+}
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.html', '.json', '.txt', '.map'}
+MIN_COMPRESS_SIZE = 256
+
+
+def update_vendor_assets():
+    for filename, url in VENDOR_ASSETS.items():
+        path = os.path.join(STATIC_DIR, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        print(f'Downloading {url}')
+        with urllib.request.urlopen(url) as response, open(path, 'wb') as f:
+            shutil.copyfileobj(response, f)
+
+
+def check_vendor_assets():
+    missing = [filename for filename in VENDOR_ASSETS if not os.path.exists(os.path.join(STATIC_DIR, filename))]
+    if missing:
+        sys.exit(f"Missing vendored assets: {', '.join(missing)}. Restore them from git or run --update-vendor.")
+
+
+def fingerprint(filename, data):
+    root, ext = os.path.splitext(filename)
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    return f'{root}.{digest}{ext}'
+
+
+def write_compressed(path, data):
+    if os.path.splitext(path)[1] not in COMPRESSIBLE_EXTENSIONS or len(data) < MIN_COMPRESS_SIZE:
+        return
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def build():
+    if os.path.exists(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    os.makedirs(DIST_DIR)
+
+    manifest = {}
+    for root, dirs, files in os.walk(STATIC_DIR):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != DIST_DIR]
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            filename = os.path.relpath(source, STATIC_DIR).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+
+            hashed = fingerprint(filename, data)
+            target = os.path.join(DIST_DIR, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+            write_compressed(target, data)
+            manifest[filename] = hashed
+
+    with open(os.path.join(DIST_DIR, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--update-vendor', action='store_true',
+                        help='re-download the pinned vendor assets before building')
+    args = parser.parse_args()
+
+    if args.update_vendor:
+        update_vendor_assets()
+    check_vendor_assets()
+    for filename, hashed in build().items():
+        print(f'{filename} -> assets/{hashed}')
+    if not brotli:
+        print('brotli is not installed; only .gz variants were written.')